@@ -1,15 +1,60 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
-from openai import OpenAI
-import requests
-import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from openai import AsyncOpenAI
+import asyncio
+import httpx
+import logging
+import orjson
 import os
+import re
+from pydantic import BaseModel, ConfigDict, ValidationError
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="AI-Powered Data Pipeline")
+# Quiet by default: per-request output only appears with LOG_LEVEL=INFO
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger(__name__)
+
+# ---------------- HTTP CLIENT ----------------
+
+_http_client = None
+
+def get_http_client():
+    # One pooled client for the app's lifetime: keep-alive connections are
+    # reused across fetches instead of paying a TLS handshake per request
+    global _http_client
+    if _http_client is None:
+        # Limits go on the transport: httpx ignores client-level limits
+        # when a custom transport is passed
+        _http_client = httpx.AsyncClient(
+            timeout=5,
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+            ),
+        )
+    return _http_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build both clients at worker startup so the first request does not
+    # pay for their construction
+    get_http_client()
+    get_client()
+    yield
+    global _http_client, _client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+app = FastAPI(title="AI-Powered Data Pipeline", lifespan=lifespan)
 
 # ✅ Allow all CORS (important for browser-based graders)
 app.add_middleware(
@@ -22,24 +67,38 @@ app.add_middleware(
 
 # ---------------- AI CLIENT ----------------
 
+_client = None
+
 def get_client():
-    token = os.getenv("AIPIPE_TOKEN")
-    if not token:
-        return None
-    return OpenAI(
-        api_key=token,
-        base_url="https://aipipe.org/openai/v1"
-    )
+    # Build the client once so its connection pool is reused across calls
+    global _client
+    if _client is None:
+        token = os.getenv("AIPIPE_TOKEN")
+        if not token:
+            return None
+        _client = AsyncOpenAI(
+            api_key=token,
+            base_url="https://aipipe.org/openai/v1"
+        )
+    return _client
 
 # ---------------- FETCH UUID ----------------
 
-def fetch_uuids():
+async def fetch_uuids():
     uuids = []
     errors = []
 
-    for _ in range(3):
+    # Fire all three requests at once so their round-trips overlap
+    client = get_http_client()
+    responses = await asyncio.gather(
+        *[client.get("https://httpbin.org/uuid") for _ in range(3)],
+        return_exceptions=True,
+    )
+
+    for r in responses:
         try:
-            r = requests.get("https://httpbin.org/uuid", timeout=5)
+            if isinstance(r, Exception):
+                raise r
             r.raise_for_status()
             uuids.append(r.json().get("uuid"))
         except Exception as e:
@@ -49,7 +108,25 @@ def fetch_uuids():
 
 # ---------------- AI ANALYSIS ----------------
 
-def analyze_with_ai(uuid_value):
+ANALYSIS_CACHE_SIZE = 4096
+
+# Both "Summary:" and "Sentiment:" lines in one scan of the model output
+_RESPONSE_FIELD_RE = re.compile(
+    r"^(Summary|Sentiment):[ \t]*(.*?)[ \t\r]*$", re.MULTILINE
+)
+_analysis_cache = OrderedDict()
+
+def cache_analysis(uuid_value, result):
+    if len(_analysis_cache) >= ANALYSIS_CACHE_SIZE:
+        _analysis_cache.popitem(last=False)  # LRU eviction
+    _analysis_cache[uuid_value] = result
+
+async def analyze_with_ai(uuid_value):
+    cached = _analysis_cache.get(uuid_value)
+    if cached:
+        _analysis_cache.move_to_end(uuid_value)
+        return cached
+
     try:
         client = get_client()
         if not client:
@@ -69,7 +146,7 @@ Summary: <text>
 Sentiment: <positive/negative/neutral>
 """
 
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="openai/gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
@@ -81,11 +158,14 @@ Sentiment: <positive/negative/neutral>
         summary = f"{uuid_value} is a randomly generated UUID."
         sentiment = "neutral"
 
-        for line in text.split("\n"):
-            if line.startswith("Summary:"):
-                summary = line.replace("Summary:", "").strip()
-            if line.startswith("Sentiment:"):
-                sentiment = line.replace("Sentiment:", "").strip().lower()
+        for field, value in _RESPONSE_FIELD_RE.findall(text):
+            if field == "Summary":
+                summary = value
+            else:
+                sentiment = value.lower()
+
+        # Only model answers are cached; fallbacks are retried next time
+        cache_analysis(uuid_value, (summary, sentiment))
 
         return summary, sentiment
 
@@ -95,61 +175,130 @@ Sentiment: <positive/negative/neutral>
             "neutral"
         )
 
-# ---------------- STORAGE ----------------
+async def analyze_batch(uuids):
+    results = {}
+    pending = []
 
-def store_results(data):
-    filepath = "results.json"
+    for uuid_value in uuids:
+        cached = _analysis_cache.get(uuid_value)
+        if cached:
+            _analysis_cache.move_to_end(uuid_value)
+            results[uuid_value] = cached
+        elif uuid_value not in pending:
+            pending.append(uuid_value)
+
+    client = get_client()
+    if pending and client:
+        # One completion for every uncached UUID instead of one per UUID
+        listing = "\n".join(f"{i}. {u}" for i, u in enumerate(pending))
+        prompt = f"""
+Analyze each of the following UUIDs in 1–2 sentences and classify
+sentiment as positive, negative, or neutral.
 
-    try:
-        if os.path.exists(filepath):
-            with open(filepath, "r") as f:
-                existing = json.load(f)
-        else:
-            existing = []
+{listing}
+
+Respond with a JSON object of the form
+{{"results": [{{"summary": "<text>", "sentiment": "<positive/negative/neutral>"}}]}}
+with exactly one entry per UUID, in the same order.
+"""
 
-        existing.extend(data)
+        try:
+            response = await client.chat.completions.create(
+                model="openai/gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+                temperature=0.2,
+                max_tokens=80 * len(pending),
+            )
 
-        with open(filepath, "w") as f:
-            json.dump(existing, f, indent=2)
+            entries = orjson.loads(response.choices[0].message.content)["results"]
+            if len(entries) != len(pending):
+                raise ValueError("Batch size mismatch")
+
+            for uuid_value, entry in zip(pending, entries):
+                summary = entry["summary"].strip()
+                sentiment = entry["sentiment"].strip().lower()
+                results[uuid_value] = (summary, sentiment)
+                cache_analysis(uuid_value, (summary, sentiment))
+
+            pending = []
+
+        except Exception:
+            # fall back to one call per UUID below
+            logger.warning("Batch analysis failed, falling back", exc_info=True)
+
+    if pending:
+        analyses = await asyncio.gather(
+            *[analyze_with_ai(uuid_value) for uuid_value in pending]
+        )
+        results.update(zip(pending, analyses))
+
+    return [results[uuid_value] for uuid_value in uuids]
+
+# ---------------- STORAGE ----------------
+
+RESULTS_FILE = "results.jsonl"
+
+def store_results(data):
+    # Append-only JSON Lines: never re-read or rewrite earlier runs
+    try:
+        with open(RESULTS_FILE, "ab", buffering=1 << 16) as f:
+            f.writelines(orjson.dumps(d) + b"\n" for d in data)
 
     except Exception:
         pass
 
+def load_results():
+    if not os.path.exists(RESULTS_FILE):
+        return
+
+    with open(RESULTS_FILE, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
 # ---------------- PIPELINE ----------------
 
-def process_pipeline(email):
-    items = []
-    errors = []
+async def process_pipeline(email):
+    uuids, errors = await fetch_uuids()
 
-    uuids, fetch_errors = fetch_uuids()
-    errors.extend(fetch_errors)
+    analyses = await analyze_batch(uuids)
 
-    for uuid_value in uuids:
-        analysis, sentiment = analyze_with_ai(uuid_value)
+    # One timestamp for the whole run, shared by every item and the envelope
+    now_iso = datetime.now(timezone.utc).isoformat(
+        timespec="milliseconds"
+    ).replace("+00:00", "Z")
 
-        item = {
+    items = [
+        {
             "original": uuid_value,
             "analysis": analysis,
             "sentiment": sentiment,
             "stored": True,
-            "timestamp": datetime.utcnow().isoformat() + "Z"
+            "timestamp": now_iso
         }
+        for uuid_value, (analysis, sentiment) in zip(uuids, analyses)
+    ]
 
-        items.append(item)
-
-    store_results(items)
+    # File I/O is blocking; keep it off the event loop
+    await asyncio.to_thread(store_results, items)
 
-    print(f"Notification sent to: {email}")
+    logger.info("Notification sent to: %s", email)
 
     return {
         "items": items,
         "notificationSent": True,
-        "processedAt": datetime.utcnow().isoformat() + "Z",
+        "processedAt": now_iso,
         "errors": errors
     }
 
 # ---------------- ENDPOINTS ----------------
 
+class PipelineRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True, frozen=True)
+
+    email: str = "unknown@example.com"
+
 @app.get("/")
 def root():
     return {"status": "healthy"}
@@ -157,13 +306,14 @@ def root():
 @app.post("/pipeline")
 @app.post("/pipeline/")
 async def run_pipeline(request: Request):
+    # Any unusable body still runs the pipeline with the default email
     try:
-        body = await request.json()
-        email = body.get("email", "unknown@example.com")
-    except Exception:
-        email = "unknown@example.com"
+        body = PipelineRequest.model_validate_json(await request.body())
+        email = body.email
+    except (ValidationError, ValueError):
+        email = PipelineRequest().email
 
-    return process_pipeline(email)
+    return await process_pipeline(email)
 
 # ---------------- START ----------------
 
@@ -8,10 +8,18 @@ import re
 import os
 import html
 import logging
-from typing import Optional, Tuple
+import threading
+from typing import List, Optional, Tuple
+import ahocorasick
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+
+try:
+    import hyperscan
+except ImportError:  # no wheel for this platform; fall back to re
+    hyperscan = None
 
 # =============================
 # Logging
@@ -24,6 +32,46 @@ logger = logging.getLogger(__name__)
 # =============================
 app = FastAPI(title="AI Security Validation API")
 
+
+class InternalErrorMiddleware:
+    """
+    Turns unexpected errors into a JSON 500. Plain ASGI, so requests that
+    do not fail pay nothing beyond one extra call.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if response_started:
+                raise
+            logger.exception("Internal validation error")
+            response = JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"detail": "Internal validation error"},
+            )
+            await response(scope, receive, send)
+
+
+# Added before CORSMiddleware so it runs inside it: the 500 response still
+# gets CORS headers, which an app-level Exception handler would not
+app.add_middleware(InternalErrorMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -36,6 +84,8 @@ app.add_middleware(
 # Models
 # =============================
 class ValidationRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     userId: str
     input: str
     category: str
@@ -48,25 +98,161 @@ class ValidationResponse(BaseModel):
     confidence: float
 
 
+class BatchValidationRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+    userId: str
+    inputs: List[str] = Field(max_length=100)
+    category: str
+
+
+class BatchValidationResponse(BaseModel):
+    results: List[ValidationResponse]
+
+
 # =============================
 # Prompt Injection Detection
 # =============================
-PROMPT_PATTERNS = [
+# Whole-word phrases: plain literals, no regex needed
+INJECTION_KEYWORDS = [
+    "developer mode",
+    "act as",
+    "you are now",
+    "override",
+    "system prompt",
+    "jailbreak",
+    "bypass",
+    "disable safety",
+]
+
+# Patterns that genuinely need a regex engine
+INJECTION_REGEXES = [
     r"\bignore\b.*\binstructions\b",
-    r"\bdeveloper mode\b",
-    r"\bact as\b",
-    r"\byou are now\b",
-    r"\boverride\b",
     r"\breveal\b.*\bprompt\b",
-    r"\bsystem prompt\b",
-    r"\bjailbreak\b",
-    r"\bbypass\b",
-    r"\bdisable safety\b",
 ]
 
-def detect_prompt_injection(text: str) -> Tuple[bool, float]:
+_COMPILED_INJECTION_REGEXES = [re.compile(p) for p in INJECTION_REGEXES]
+
+# Nothing shorter than the shortest keyword can match (both regexes need
+# longer inputs), so short inputs skip scanning altogether
+_MIN_INJECTION_LEN = min(len(kw) for kw in INJECTION_KEYWORDS)
+
+# Confidence is 0.85 + 0.05 per match, capped at 1.0: it saturates at three
+# matches, so scanning stops there
+MAX_COUNTED_MATCHES = 3
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+# Keyword scanning. Both backends only find the literal keywords; the word
+# boundary check is done here in Python with _is_word_char, which matches
+# re's Unicode \b. Hyperscan's own \b is ASCII-only and would disagree on
+# accented letters next to a keyword.
+_KEYWORD_DB = None
+if hyperscan is not None:
+    # Hyperscan compiles every keyword into one DFA and scans in a single
+    # pass. No SINGLEMATCH: a hit that fails the boundary check must not
+    # hide a later valid one.
+    _KEYWORD_DB = hyperscan.Database()
+    _KEYWORD_DB.compile(
+        expressions=[kw.encode() for kw in INJECTION_KEYWORDS],
+        ids=list(range(len(INJECTION_KEYWORDS))),
+        elements=len(INJECTION_KEYWORDS),
+    )
+
+# Fallback when Hyperscan is unavailable: Aho-Corasick finds every keyword
+# in one linear pass
+_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _kw in INJECTION_KEYWORDS:
+    _KEYWORD_AUTOMATON.add_word(_kw, _kw)
+_KEYWORD_AUTOMATON.make_automaton()
+
+# Routes run in FastAPI's threadpool and a Hyperscan scratch space can only
+# be used by one scan at a time, so every worker thread gets its own
+_scratch = threading.local()
+
+
+def _get_scratch():
+    scratch = getattr(_scratch, "space", None)
+    if scratch is None:
+        scratch = _scratch.space = hyperscan.Scratch(_KEYWORD_DB)
+    return scratch
+
+
+def _char_before(buf: bytes, i: int) -> str:
+    # Keywords are ASCII, so match offsets always sit on UTF-8 boundaries
+    j = i - 1
+    while j > 0 and 0x80 <= buf[j] < 0xC0:  # skip continuation bytes
+        j -= 1
+    return buf[j:i].decode("utf-8", "surrogatepass")
+
+
+def _char_after(buf: bytes, i: int) -> str:
+    lead = buf[i]
+    size = 1 if lead < 0x80 else 2 if lead < 0xE0 else 3 if lead < 0xF0 else 4
+    return buf[i:i + size].decode("utf-8", "surrogatepass")
+
+
+def _scan_keywords_hyperscan(text_lower: str) -> int:
+    # surrogatepass: JSON bodies may carry lone surrogates
+    buf = text_lower.encode("utf-8", "surrogatepass")
+    found = set()
+
+    def on_match(keyword_id, start, end, flags, context):
+        # Without SOM flags Hyperscan reports no start offset; derive it
+        start = end - len(INJECTION_KEYWORDS[keyword_id])
+        if start > 0 and _is_word_char(_char_before(buf, start)):
+            return False
+        if end < len(buf) and _is_word_char(_char_after(buf, end)):
+            return False
+        found.add(keyword_id)
+        return len(found) >= MAX_COUNTED_MATCHES  # truthy halts the scan
+
+    try:
+        _KEYWORD_DB.scan(buf, match_event_handler=on_match, scratch=_get_scratch())
+    except hyperscan.ScanTerminated:
+        pass
+    return len(found)
+
+
+def _scan_keywords_automaton(text_lower: str) -> int:
+    found = set()
+    for end, kw in _KEYWORD_AUTOMATON.iter(text_lower):
+        if len(found) >= MAX_COUNTED_MATCHES:
+            break
+        start = end - len(kw) + 1
+        # Same semantics as \b...\b: reject hits inside a longer word
+        if start > 0 and _is_word_char(text_lower[start - 1]):
+            continue
+        if end + 1 < len(text_lower) and _is_word_char(text_lower[end + 1]):
+            continue
+        found.add(kw)
+    return len(found)
+
+
+def _count_injection_matches(text: str) -> int:
     text_lower = text.lower()
-    matches = sum(1 for p in PROMPT_PATTERNS if re.search(p, text_lower))
+    if _KEYWORD_DB is not None:
+        count = _scan_keywords_hyperscan(text_lower)
+    else:
+        count = _scan_keywords_automaton(text_lower)
+
+    # The two real regexes need Unicode \b too, so they always go through re
+    for p in _COMPILED_INJECTION_REGEXES:
+        if count >= MAX_COUNTED_MATCHES:
+            break
+        if p.search(text_lower):
+            count += 1
+    return count
+
+
+def detect_prompt_injection(text: str) -> Tuple[bool, float]:
+    if len(text) < _MIN_INJECTION_LEN:
+        return False, 0.0
+
+    matches = _count_injection_matches(text)
     if matches > 0:
         confidence = min(1.0, 0.85 + matches * 0.05)
         return True, confidence
@@ -84,57 +270,68 @@ def sanitize_output(text: str) -> str:
 # Validation Endpoint
 # Accept BOTH "/" and "/validate"
 # =============================
-@app.post("/", response_model=ValidationResponse)
-@app.post("/validate", response_model=ValidationResponse)
-async def validate_input(request: ValidationRequest):
-
-    try:
-        # Normalize category check
-        if request.category.lower().strip() != "prompt injection":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid category"
-            )
+ACCEPTED_CATEGORIES = frozenset({"prompt injection"})
 
-        if not request.input.strip():
-            return ValidationResponse(
-                blocked=False,
-                reason="Empty input",
-                sanitizedOutput="",
-                confidence=0.0
-            )
-
-        # Prompt Injection Detection
-        blocked, confidence = detect_prompt_injection(request.input)
 
-        if blocked:
-            logger.warning(f"Prompt injection blocked | userId={request.userId}")
-            return ValidationResponse(
-                blocked=True,
-                reason="Prompt injection attempt detected",
-                sanitizedOutput=None,
-                confidence=round(confidence, 2)
-            )
+def check_category(category: str) -> None:
+    # Normalize category check
+    if category.strip().lower() not in ACCEPTED_CATEGORIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid category"
+        )
 
-        # Safe input
-        sanitized = sanitize_output(request.input)
 
+def validate_text(text: str, user_id: str) -> ValidationResponse:
+    if not text.strip():
         return ValidationResponse(
             blocked=False,
-            reason="Input passed all security checks",
-            sanitizedOutput=sanitized,
-            confidence=0.95
+            reason="Empty input",
+            sanitizedOutput="",
+            confidence=0.0
         )
 
-    except HTTPException:
-        raise
-    except Exception:
-        logger.error("Internal validation error")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal validation error"
+    # Prompt Injection Detection
+    blocked, confidence = detect_prompt_injection(text)
+
+    if blocked:
+        logger.warning(f"Prompt injection blocked | userId={user_id}")
+        return ValidationResponse(
+            blocked=True,
+            reason="Prompt injection attempt detected",
+            sanitizedOutput=None,
+            confidence=round(confidence, 2)
         )
 
+    # Safe input
+    sanitized = sanitize_output(text)
+
+    return ValidationResponse(
+        blocked=False,
+        reason="Input passed all security checks",
+        sanitizedOutput=sanitized,
+        confidence=0.95
+    )
+
+
+@app.post("/", response_model=ValidationResponse)
+@app.post("/validate", response_model=ValidationResponse)
+def validate_input(request: ValidationRequest):
+    check_category(request.category)
+    return validate_text(request.input, request.userId)
+
+
+# =============================
+# Batch Validation Endpoint
+# One HTTP round-trip and one body parse for many inputs
+# =============================
+@app.post("/validate/batch", response_model=BatchValidationResponse)
+def validate_batch(request: BatchValidationRequest):
+    check_category(request.category)
+    return BatchValidationResponse(
+        results=[validate_text(text, request.userId) for text in request.inputs]
+    )
+
 
 # =============================
 # Health Check
@@ -5,9 +5,11 @@ Implements SSE streaming with proper error handling.
 
 import os
 import asyncio
-import json
+import orjson
+from contextlib import aclosing, asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import httpx
@@ -15,7 +17,20 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Streaming LLM API - Renewable Energy")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP/2 client for the app's lifetime: streams reuse warm
+    # connections to the upstream API instead of a new TLS handshake each
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(max_keepalive_connections=50),
+    )
+    yield
+    await app.state.http.aclose()
+
+
+app = FastAPI(title="Streaming LLM API - Renewable Energy", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,6 +56,105 @@ if not API_KEY:
 
 MODEL_NAME = "gpt-4o-mini"
 
+# Fixed for the process lifetime, so built once instead of per request
+_CHAT_URL = f"{API_BASE}/chat/completions"
+_HEADERS = {
+    "Authorization": f"Bearer {API_KEY}",
+    "Content-Type": "application/json",
+}
+
+# Each stream holds an upstream connection for up to 60s; cap how many can
+# be open at once so a few clients cannot exhaust sockets or quota
+MAX_CONCURRENT_STREAMS = int(os.getenv("MAX_CONCURRENT_STREAMS", "20"))
+_stream_slots = asyncio.Semaphore(MAX_CONCURRENT_STREAMS)
+
+# First SSE frame: an empty delta padded to 2 KB so proxies flush at once.
+# It never changes, so it is encoded once at import.
+_PREAMBLE = (
+    b"data: "
+    + orjson.dumps({"choices": [{"delta": {"content": ""}}], "padding": " " * 2048})
+    + b"\n\n"
+)
+
+
+def sse_frame(obj) -> bytes:
+    return b"data: " + orjson.dumps(obj) + b"\n\n"
+
+
+# Fixed frames, encoded once
+_DONE = b"data: [DONE]\n\n"
+_ERR_TIMEOUT = sse_frame({"error": "Request timed out"}) + _DONE
+
+
+def ends_stream(buf) -> bool:
+    # Only a frame that starts with the marker ends the stream; "[DONE]"
+    # inside generated text must not
+    return buf.startswith(b"data: [DONE]") or b"\n\ndata: [DONE]" in buf
+
+
+# Force renewable energy article generation (assignment requirement)
+ENFORCED_PROMPT = (
+    "Write a detailed 275-word article (minimum 1100 characters) "
+    "about renewable energy. Include at least one quote and real-world statistics."
+)
+
+# The upstream request body never varies per request, so it is serialized
+# once here and sent as raw bytes
+_PAYLOAD = orjson.dumps({
+    "model": MODEL_NAME,
+    "messages": [
+        {"role": "system", "content": "You are an expert energy policy analyst."},
+        {"role": "user", "content": ENFORCED_PROMPT},
+    ],
+    "stream": True,
+    "max_tokens": 800,
+    "temperature": 0.7,
+})
+
+
+
+async def coalesce(chunks, max_bytes=4096, max_delay=0.05):
+    """
+    Merges small upstream chunks into larger writes. A buffer is flushed once
+    it reaches max_bytes, holds the [DONE] marker, or has waited max_delay
+    seconds, so slow streams still reach the client promptly.
+    """
+    loop = asyncio.get_running_loop()
+    it = chunks.__aiter__()
+    buf = bytearray()
+    deadline = None
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+
+            timeout = max(0.0, deadline - loop.time()) if buf else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if done:
+                task, pending = pending, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    break
+                if not buf:
+                    deadline = loop.time() + max_delay
+                buf += chunk
+                full = len(buf) >= max_bytes or ends_stream(buf)
+                if not full and loop.time() < deadline:
+                    continue
+
+            yield bytes(buf)
+            buf.clear()
+
+        if buf:
+            yield bytes(buf)
+
+    finally:
+        if pending is not None:
+            pending.cancel()
 
 
 class PromptRequest(BaseModel):
@@ -54,73 +168,76 @@ async def stream_llm_response(prompt: str):
     """
 
     # Immediate flush chunk (reduces first-token latency issues)
-    # Immediate flush chunk (reduces first-token latency issues)
-    padding = " " * 2048
-    yield f'data: {json.dumps({"choices":[{"delta":{"content":""}}],"padding":padding})}\n\n'
+    yield _PREAMBLE
     await asyncio.sleep(0)
 
+    try:
+        async with app.state.http.stream(
+            "POST", _CHAT_URL, headers=_HEADERS, content=_PAYLOAD
+        ) as response:
+
+            if response.status_code != 200:
+                error_text = await response.aread()
+                yield sse_frame({"error": f"API error {response.status_code}"}) + _DONE
+                return
+
+            # Upstream already speaks SSE, so forward its bytes untouched
+            # instead of decoding and re-framing every line. aiter_bytes
+            # (not aiter_raw) still undoes any gzip content-encoding.
+            async with aclosing(coalesce(response.aiter_bytes())) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+                    if ends_stream(chunk):
+                        break
 
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-    }
+    except httpx.TimeoutException:
+        yield _ERR_TIMEOUT
 
-    # Force renewable energy article generation (assignment requirement)
-    enforced_prompt = (
-        "Write a detailed 275-word article (minimum 1100 characters) "
-        "about renewable energy. Include at least one quote and real-world statistics."
-    )
+    except Exception as e:
+        yield sse_frame({"error": str(e)}) + _DONE
 
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {"role": "system", "content": "You are an expert energy policy analyst."},
-            {"role": "user", "content": enforced_prompt},
-        ],
-        "stream": True,
-        "max_tokens": 800,
-        "temperature": 0.7,
-    }
 
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            async with client.stream(
-                "POST",
-                f"{API_BASE}/chat/completions",
-                headers=headers,
-                json=payload,
-            ) as response:
-
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    yield f'data: {json.dumps({"error": f"API error {response.status_code}"})}\n\n'
-                    yield "data: [DONE]\n\n"
-                    return
-
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-
-                        if data.strip() == "[DONE]":
-                            yield "data: [DONE]\n\n"
-                            break
-
-                        yield f"data: {data}\n\n"
+def slot_releaser():
+    """
+    Returns a callable that gives back one stream slot, at most once.
+    """
+    released = False
 
-    except httpx.TimeoutException:
-        yield 'data: {"error":"Request timed out"}\n\n'
-        yield "data: [DONE]\n\n"
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            _stream_slots.release()
 
-    except Exception as e:
-        yield f'data: {json.dumps({"error": str(e)})}\n\n'
-        yield "data: [DONE]\n\n"
+    return release
+
+
+async def limit_concurrency(stream, release):
+    """
+    Runs the wrapped generator, returning its stream slot when it ends.
+    """
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        release()
 
 
 @app.post("/")
 @app.post("/stream")
 async def stream_endpoint(request: PromptRequest):
+    if _stream_slots.locked():
+        raise HTTPException(status_code=429, detail="Too many concurrent streams")
+
+    # No await between the check and the acquire: the slot is taken here,
+    # so a burst cannot get past the check and queue on the semaphore
+    await _stream_slots.acquire()
+    release = slot_releaser()
+
     return StreamingResponse(
-        stream_llm_response(request.prompt),
+        limit_concurrency(stream_llm_response(request.prompt), release),
+        # Also released after the response, in case the body never runs
+        background=BackgroundTask(release),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",